@@ -16,79 +16,221 @@ Usage:
 
 import gpxpy
 import gpxpy.gpx
+import gpxpy.gpxfield
+import gpxpy.utils
+import numpy as np
 import sys
-from datetime import timedelta
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
 
 # --- Configuration ---
 TIME_INTERVAL_SECONDS = 10
 # ---------------------
 
-def manual_interpolate_segment(points, time_interval_seconds):
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+@dataclass(slots=True)
+class _InterpPoint:
     """
-    Manually interpolates a list of GPX points at a fixed time interval.
-    Returns a new list of interpolated points.
+    A lightweight interpolated sample. Much cheaper to create than a
+    GPXTrackPoint; converted with to_track_points() only when the points
+    are handed to gpxpy.
     """
-    if not points:
-        return []
+    latitude: float
+    longitude: float
+    elevation: Optional[float]
+    time: datetime
 
-    interpolated_points = []
-    interval = timedelta(seconds=time_interval_seconds)
+def to_track_points(points):
+    """
+    Converts the _InterpPoint records in a list returned by
+    manual_interpolate_segment into GPXTrackPoints. Original points are
+    passed through unchanged.
+    """
+    GPXTrackPoint = gpxpy.gpx.GPXTrackPoint
+    return [
+        GPXTrackPoint(latitude=p.latitude, longitude=p.longitude, elevation=p.elevation, time=p.time)
+        if type(p) is _InterpPoint else p
+        for p in points
+    ]
 
-    for i in range(len(points) - 1):
-        p1 = points[i]
-        p2 = points[i+1]
+def can_stream_gpx(gpx):
+    """
+    Returns True if write_gpx_stream() can write this GPX object. The stream
+    writer emits each track's points before closing it, so it does not
+    handle extensions that GPX 1.1 places after the points.
+    """
+    return not gpx.extensions and not any(
+        segment.extensions for track in gpx.tracks for segment in track.segments)
 
-        # Add the starting point of the pair
-        interpolated_points.append(p1)
+def write_gpx_stream(out, gpx):
+    """
+    Writes a GPX object as GPX 1.1 XML to the file-like object out, producing
+    the same document as gpx.to_xml() but one track point at a time, so the
+    whole document never has to be held in memory.
 
-        # Ensure both points have time data to interpolate between
-        if p1.time is None or p2.time is None:
-            sys.stderr.write(f"Warning: Skipping interpolation for a segment pair due to missing time data.\n")
-            sys.stderr.write(f"p1.lat/lon {p1.latitude}/{p1.longitude}.\n")
-            continue
+    Segments may hold _InterpPoint records as well as gpxpy points. The
+    document skeleton and the original points are still serialized by gpxpy;
+    only the interpolated points take the fast path.
+    """
+    make_str = gpxpy.utils.make_str
+    format_time = gpxpy.gpxfield.format_time
+    gpx_fields_to_xml = gpxpy.gpxfield.gpx_fields_to_xml
 
-        time_diff_seconds = (p2.time - p1.time).total_seconds()
+    # Header: serialize the document with its tracks detached and drop the
+    # closing tag
+    tracks, gpx.tracks = gpx.tracks, []
+    try:
+        skeleton = gpx.to_xml()
+    finally:
+        gpx.tracks = tracks
+    footer = '\n</gpx>'
+    out.write(skeleton[:-len(footer)])
 
-        # If points are closer than the interval, just move to the next pair
-        if time_diff_seconds <= time_interval_seconds:
-            continue
+    def point_to_xml(point):
+        if type(point) is not _InterpPoint:
+            return gpx_fields_to_xml(point, 'trkpt', gpx.version, nsmap=gpx.nsmap, indent='      ')
+        ele = '' if point.elevation is None else f'\n        <ele>{make_str(point.elevation)}</ele>'
+        # GPXTrackPoint stores "latitude or 0", so a zero coordinate is
+        # written as the int 0 by gpxpy; do the same
+        return (f'\n      <trkpt lat="{make_str(point.latitude or 0)}" lon="{make_str(point.longitude or 0)}">'
+                f'{ele}\n        <time>{format_time(point.time)}</time>\n      </trkpt>')
 
-        # Calculate deltas for position
-        lat_diff = p2.latitude - p1.latitude
-        lon_diff = p2.longitude - p1.longitude
+    for track in gpx.tracks:
+        # Track header (name, description, ...), again via a detached copy
+        segments, track.segments = track.segments, []
+        try:
+            track_xml = gpx_fields_to_xml(track, 'trk', gpx.version, nsmap=gpx.nsmap, indent='  ')
+        finally:
+            track.segments = segments
+        out.write(track_xml[:-len('\n  </trk>')])
 
-        # Handle elevation, including if it's None
-        p1_ele = p1.elevation if p1.elevation is not None else 0
-        p2_ele = p2.elevation if p2.elevation is not None else 0
-        ele_diff = p2_ele - p1_ele
-        ele_is_none = p1.elevation is None and p2.elevation is None
+        for segment in segments:
+            out.write('\n    <trkseg>')
+            out.writelines(map(point_to_xml, segment.points))
+            out.write('\n    </trkseg>')
 
-        current_time = p1.time + interval
-        
-        # Loop and add new points until we reach the next original point
-        while current_time < p2.time:
-            # Calculate interpolation factor (t) as a 0.0-1.0 value
-            t = (current_time - p1.time).total_seconds() / time_diff_seconds
-
-            new_lat = p1.latitude + (lat_diff * t)
-            new_lon = p1.longitude + (lon_diff * t)
-            new_ele = p1_ele + (ele_diff * t)
-            
-            # Create the new point
-            new_point = gpxpy.gpx.GPXTrackPoint(
-                latitude=new_lat,
-                longitude=new_lon,
-                elevation=None if ele_is_none else new_ele,
-                time=current_time
-            )
-            interpolated_points.append(new_point)
-            
-            current_time += interval
+        out.write('\n  </trk>')
 
-    # Add the very last point from the original segment
-    interpolated_points.append(points[-1])
-    
-    return interpolated_points
+    out.write(footer)
+
+def _segment_arrays(points):
+    """
+    Pulls a segment into flat arrays (one per field) so the interpolation
+    never touches the gpxpy point objects. Returns
+    (times, lats, lons, eles, ts_micros); missing elevations and times are NaN.
+    """
+    # Times are stored as whole microseconds relative to the first timed
+    # point: that works for naive and aware datetimes alike, and the
+    # differences are exact, so the gaps match timedelta.total_seconds() to
+    # the last bit.
+    n = len(points)
+    times = [p.time for p in points]
+    ref_time = next((t for t in times if t is not None), None)
+    lats = np.fromiter((p.latitude for p in points), dtype=np.float64, count=n)
+    lons = np.fromiter((p.longitude for p in points), dtype=np.float64, count=n)
+    eles = np.fromiter((np.nan if p.elevation is None else p.elevation for p in points),
+                       dtype=np.float64, count=n)
+    ts_micros = np.fromiter((np.nan if t is None else (t - ref_time) // ONE_MICROSECOND for t in times),
+                            dtype=np.float64, count=n)
+    return times, lats, lons, eles, ts_micros
+
+def interpolate_segments(segments, time_interval_seconds):
+    """
+    Interpolates several lists of GPX points at a fixed time interval in one
+    batch. Returns one list per segment, as manual_interpolate_segment does.
+
+    All segments are flattened into one set of arrays with segment
+    boundaries tracked by index, and every new sample is computed in a
+    handful of NumPy array operations.
+    """
+    sizes = [len(points) for points in segments]
+    bounds = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+    n = int(bounds[-1])
+    if n == 0:
+        return [[] for _ in segments]
+
+    columns = [_segment_arrays(points) for points in segments if points]
+    times = [t for column in columns for t in column[0]]
+    lats, lons, eles, ts_micros = (np.concatenate([column[field] for column in columns])
+                                   for field in range(1, 5))
+    points_flat = [p for points in segments for p in points]
+
+    # Missing elevations are interpolated as 0 unless both ends are missing
+    ele_missing = np.isnan(eles)
+    eles[ele_missing] = 0
+
+    # Pair i is (point i, point i + 1); the pairs that straddle two segments
+    # are not real pairs and are never interpolated
+    is_pair = np.ones(n - 1, dtype=bool)
+    boundaries = bounds[1:-1]
+    is_pair[boundaries[(boundaries > 0) & (boundaries < n)] - 1] = False
+
+    # Per-pair time gaps; NaN marks a pair with missing time data
+    time_diff_seconds = np.diff(ts_micros) / 1e6
+    for i in np.flatnonzero(np.isnan(time_diff_seconds) & is_pair):
+        sys.stderr.write(f"Warning: Skipping interpolation for a segment pair due to missing time data.\n")
+        sys.stderr.write(f"p1.lat/lon {lats[i]}/{lons[i]}.\n")
+
+    # Number of new samples strictly between each pair (k * interval < time_diff)
+    needs_fill = (time_diff_seconds > time_interval_seconds) & is_pair
+    counts = np.zeros(n - 1, dtype=np.int64)
+    counts[needs_fill] = np.ceil(time_diff_seconds[needs_fill] / time_interval_seconds).astype(np.int64) - 1
+    sample_starts = np.cumsum(counts) - counts
+
+    # Build the target grid: for every new sample, the pair it belongs to and
+    # its step number k (the sample sits k intervals after the pair's first point).
+    # The grid restarts at every original point, so this is a per-pair lerp
+    # rather than one interpolator (e.g. scipy's interp1d) sampled on a single
+    # grid from the segment start, which would move the samples.
+    pair_idx = np.repeat(np.arange(n - 1), counts)
+    steps = np.arange(len(pair_idx)) - np.repeat(sample_starts, counts) + 1
+
+    # Calculate interpolation factor (t) as a 0.0-1.0 value for every sample
+    t = steps * float(time_interval_seconds) / time_diff_seconds[pair_idx]
+    new_lats = lats[pair_idx] + (lats[pair_idx + 1] - lats[pair_idx]) * t
+    new_lons = lons[pair_idx] + (lons[pair_idx + 1] - lons[pair_idx]) * t
+    new_eles = eles[pair_idx] + (eles[pair_idx + 1] - eles[pair_idx]) * t
+    ele_is_none = ele_missing[pair_idx] & ele_missing[pair_idx + 1]
+
+    # Every sample time is a whole number of intervals after its pair's first
+    # point, so build each distinct timedelta once instead of once per sample
+    step_deltas = [timedelta(seconds=k * time_interval_seconds) for k in range(int(counts.max(initial=0)) + 1)]
+
+    # Materialize the new points in one pass
+    new_points = [
+        _InterpPoint(lat, lon, None if none else ele, times[pair] + step_deltas[step])
+        for pair, step, lat, lon, ele, none in zip(
+            pair_idx.tolist(), steps.tolist(), new_lats.tolist(),
+            new_lons.tolist(), new_eles.tolist(), ele_is_none.tolist())
+    ]
+
+    # Merge with the original points, keeping each original ahead of the
+    # samples interpolated after it
+    sample_starts = sample_starts.tolist()
+    counts = counts.tolist()
+    results = []
+    for first, last in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        interpolated_points = []
+        for i in range(first, last - 1):
+            interpolated_points.append(points_flat[i])
+            interpolated_points.extend(new_points[sample_starts[i]:sample_starts[i] + counts[i]])
+
+        # Add the very last point from the original segment
+        if last > first:
+            interpolated_points.append(points_flat[last - 1])
+        results.append(interpolated_points)
+
+    return results
+
+def manual_interpolate_segment(points, time_interval_seconds):
+    """
+    Manually interpolates a list of GPX points at a fixed time interval.
+    Returns a new list holding the original points with the interpolated
+    samples, as _InterpPoint records, in between.
+    """
+    return interpolate_segments([points], time_interval_seconds)[0]
 
 def main():
     # Check if an input file was provided
@@ -120,6 +262,15 @@ def main():
     if hasattr(gpx, 'metadata'):
         interpolated_gpx.metadata = gpx.metadata
 
+    # Interpolate every segment of every track in one batch. If the
+    # batch fails, each segment is retried on its own below so that one bad
+    # segment only affects itself.
+    batch = [segment.points for track in gpx.tracks for segment in track.segments if segment.points]
+    try:
+        batch_results = iter(interpolate_segments(batch, TIME_INTERVAL_SECONDS))
+    except Exception:
+        batch_results = None
+
     # Iterate through each track and segment in the original file
     for track in gpx.tracks:
         # Create a new track for the interpolated data
@@ -132,9 +283,12 @@ def main():
             # Create a new segment to hold the interpolated points
             new_segment = gpxpy.gpx.GPXTrackSegment()
             
-            # Interpolate the segment points using our manual function
+            # Use the batch result, or interpolate the segment points on their own
             try:
-                interpolated_points = manual_interpolate_segment(segment.points, TIME_INTERVAL_SECONDS)
+                if batch_results is not None:
+                    interpolated_points = next(batch_results)
+                else:
+                    interpolated_points = manual_interpolate_segment(segment.points, TIME_INTERVAL_SECONDS)
                 new_segment.points.extend(interpolated_points)
 
             except Exception as e:
@@ -149,8 +303,15 @@ def main():
         # Add the new track to the new GPX file
         interpolated_gpx.tracks.append(new_track)
 
-    # Write the final XML to standard output
-    sys.stdout.write(interpolated_gpx.to_xml())
+    # Stream the final XML to standard output, falling back to gpxpy's
+    # serializer for documents the stream writer does not handle
+    if can_stream_gpx(interpolated_gpx):
+        write_gpx_stream(sys.stdout, interpolated_gpx)
+    else:
+        for track in interpolated_gpx.tracks:
+            for segment in track.segments:
+                segment.points = to_track_points(segment.points)
+        sys.stdout.write(interpolated_gpx.to_xml())
     sys.stderr.write(f"Successfully processed '{input_file_name}' and printed to stdout.\n")
 
 if __name__ == "__main__":
@@ -3,79 +3,128 @@
 Analyze loop patterns in the school.gpx file
 """
 
-import xml.etree.ElementTree as ET
-import math
-from datetime import datetime
-
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance in meters using Haversine formula"""
-    R = 6371000  # Earth radius in meters
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-
-    a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-
-    return R * c
-
-def parse_iso_time(time_str):
-    """Parse ISO 8601 time string"""
-    return datetime.strptime(time_str, '%Y-%m-%dT%H:%M:%SZ')
+import sys
+
+import numpy as np
+from lxml import etree
+
+# Compiled haversine kernel (see geo_ext.pyx); fall back to NumPy if it isn't built
+try:
+    from geo_ext import haversine_from_origin, haversine_consecutive
+except ImportError:
+    haversine_from_origin = haversine_consecutive = None
+
+R = 6371000  # Earth radius in meters
+
+def haversine_from_start(lat_r, lon_r, cos_lat):
+    """
+    Calculate distances in meters from the first point to every point using Haversine formula.
+
+    The start point's radians and cosine are read once and reused for every
+    point rather than gathered again per point.
+    """
+    phi1, lambda1, cos_phi1 = lat_r[0], lon_r[0], cos_lat[0]
+    if haversine_from_origin is not None:
+        out = np.empty(lat_r.shape)
+        haversine_from_origin(phi1, lambda1, cos_phi1, lat_r, lon_r, cos_lat, out)
+        return out
+
+    a = np.sin((lat_r - phi1)/2)**2 + cos_phi1 * cos_lat * np.sin((lon_r - lambda1)/2)**2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+def haversine_steps(lat_r, lon_r, cos_lat):
+    """
+    Calculate distances in meters between consecutive points using Haversine formula.
+
+    Each point's precomputed radians and cosine serve both the step into it
+    and the step out of it; shifted slices are used instead of index arrays,
+    so nothing is gathered or copied.
+    """
+    if haversine_consecutive is not None:
+        out = np.empty(max(lat_r.shape[0] - 1, 0))
+        haversine_consecutive(lat_r, lon_r, cos_lat, out)
+        return out
+
+    a = np.sin(np.diff(lat_r)/2)**2 + cos_lat[:-1] * cos_lat[1:] * np.sin(np.diff(lon_r)/2)**2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+def parse_iso_times(time_strs):
+    """Parse ISO 8601 UTC time strings into epoch seconds"""
+    # datetime64 has no timezone support, so drop the 'Z' and treat times as UTC
+    return np.char.rstrip(np.array(time_strs), 'Z').astype('datetime64[s]').astype(np.int64)
 
 # Parse GPX file
 import os
 script_dir = os.path.dirname(os.path.abspath(__file__))
-tree = ET.parse(os.path.join(script_dir, 'gpx/school.gpx'))
-root = tree.getroot()
-
-# Extract namespace
-ns = {'gpx': 'http://www.topografix.com/GPX/1/1'}
-
-points = []
-for trkpt in root.findall('.//gpx:trkpt', ns):
-    lat = float(trkpt.get('lat'))
-    lon = float(trkpt.get('lon'))
-    ele = float(trkpt.find('gpx:ele', ns).text)
-    time = parse_iso_time(trkpt.find('gpx:time', ns).text)
-    points.append((lat, lon, ele, time))
 
-print(f"Total points: {len(points)}")
-print(f"Duration: {(points[-1][3] - points[0][3]).total_seconds() / 60:.1f} minutes")
-print(f"\nStarting point: lat={points[0][0]:.6f}, lon={points[0][1]:.6f}")
-print(f"Ending point:   lat={points[-1][0]:.6f}, lon={points[-1][1]:.6f}")
+# GPX namespace, in lxml's {uri}tag form
+ns = '{http://www.topografix.com/GPX/1/1}'
+
+# Stream track points instead of building the whole tree, collecting each field in its own column
+lats_list = []
+lons_list = []
+eles_list = []
+time_strs = []
+for _, trkpt in etree.iterparse(os.path.join(script_dir, 'gpx/school.gpx'), events=('end',), tag=ns + 'trkpt'):
+    lats_list.append(float(trkpt.get('lat')))
+    lons_list.append(float(trkpt.get('lon')))
+    eles_list.append(float(trkpt.findtext(ns + 'ele')))
+    time_strs.append(trkpt.findtext(ns + 'time'))
+
+    # Free the point and any already-processed siblings
+    trkpt.clear()
+    while trkpt.getprevious() is not None:
+        del trkpt.getparent()[0]
+
+# Column arrays for vectorized calculations
+lats = np.asarray(lats_list, dtype=np.float64)
+lons = np.asarray(lons_list, dtype=np.float64)
+eles = np.asarray(eles_list, dtype=np.float64)
+times_epoch = parse_iso_times(time_strs)
+times = times_epoch - times_epoch[0]  # seconds since start
+
+# Radians and cos(latitude), computed once and shared by every distance calculation
+lat_r = np.radians(lats)
+lon_r = np.radians(lons)
+cos_lat = np.cos(lat_r)
+point_idx = np.arange(len(lats))
+
+print(f"Total points: {len(lats)}")
+print(f"Duration: {(times[-1] - times[0]) / 60:.1f} minutes")
+print(f"\nStarting point: lat={lats[0]:.6f}, lon={lons[0]:.6f}")
+print(f"Ending point:   lat={lats[-1]:.6f}, lon={lons[-1]:.6f}")
+
+# Distance from the start to every point
+dist_from_start = haversine_from_start(lat_r, lon_r, cos_lat)
 
 # Calculate distance from start to end
-start_to_end_dist = haversine_distance(points[0][0], points[0][1], points[-1][0], points[-1][1])
+start_to_end_dist = dist_from_start[-1]
 print(f"Distance from start to end: {start_to_end_dist:.1f} meters")
 
 # Find points where user returns close to starting point
-start_lat, start_lon = points[0][0], points[0][1]
 threshold = 50  # meters
 
 print(f"\n=== Points within {threshold}m of start ===")
-returns_to_start = []
-for i, (lat, lon, ele, time) in enumerate(points):
-    dist = haversine_distance(start_lat, start_lon, lat, lon)
-    if dist < threshold and i > 10:  # Skip first few points
-        time_since_start = (time - points[0][3]).total_seconds() / 60
-        returns_to_start.append((i, dist, time_since_start))
-        print(f"Point {i:3d}: {dist:5.1f}m from start (at {time_since_start:.1f} min)")
+near_start = (dist_from_start < threshold) & (point_idx > 10)  # Skip first few points
+returns_to_start = np.nonzero(near_start)[0]
+# Collect the rows and write them at once rather than print()ing each one
+rows = []
+for i in returns_to_start:
+    time_since_start = times[i] / 60
+    rows.append(f"Point {i:3d}: {dist_from_start[i]:5.1f}m from start (at {time_since_start:.1f} min)\n")
+sys.stdout.write(''.join(rows))
 
 # Calculate total distance traveled
-total_distance = 0
-for i in range(1, len(points)):
-    dist = haversine_distance(points[i-1][0], points[i-1][1], points[i][0], points[i][1])
-    total_distance += dist
+step_dists = haversine_steps(lat_r, lon_r, cos_lat)
+total_distance = step_dists.sum()
 
 print(f"\n=== Overall Statistics ===")
 print(f"Total distance traveled: {total_distance:.1f} meters ({total_distance/1609.34:.2f} miles)")
 print(f"Times returned to start: {len(returns_to_start)}")
 
 # Analyze elevation changes
-max_ele = max(p[2] for p in points)
-min_ele = min(p[2] for p in points)
+max_ele = eles.max()
+min_ele = eles.min()
 print(f"Elevation range: {min_ele:.1f}m to {max_ele:.1f}m (change: {max_ele - min_ele:.1f}m)")
 
 # Look for major direction changes (potential loop completions)
@@ -85,8 +134,8 @@ print(f"\n=== Analyzing path segments ===")
 sample_interval = 20
 print("Time (min) | Lat      | Lon       | Distance from start")
 print("-" * 60)
-for i in range(0, len(points), sample_interval):
-    lat, lon, ele, time = points[i]
-    dist_from_start = haversine_distance(start_lat, start_lon, lat, lon)
-    time_min = (time - points[0][3]).total_seconds() / 60
-    print(f"{time_min:6.1f}     | {lat:.6f} | {lon:.6f} | {dist_from_start:6.1f}m")
+rows = []
+for i in range(0, len(lats), sample_interval):
+    time_min = times[i] / 60
+    rows.append(f"{time_min:6.1f}     | {lats[i]:.6f} | {lons[i]:.6f} | {dist_from_start[i]:6.1f}m\n")
+sys.stdout.write(''.join(rows))
@@ -3,68 +3,102 @@
 Analyze velocity data from GPX file to understand smoothing requirements
 """
 
-import xml.etree.ElementTree as ET
-import math
-from datetime import datetime
+import sys
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance in meters using Haversine formula"""
-    R = 6371000  # Earth radius in meters
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
+import numpy as np
+from lxml import etree
 
-    a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+# Compiled haversine kernel (see geo_ext.pyx); fall back to NumPy if it isn't built
+try:
+    from geo_ext import haversine_consecutive
+except ImportError:
+    haversine_consecutive = None
 
-    return R * c
+R = 6371000  # Earth radius in meters
 
-def parse_iso_time(time_str):
-    """Parse ISO 8601 time string"""
-    return datetime.strptime(time_str, '%Y-%m-%dT%H:%M:%SZ')
+def haversine_steps(lat_r, lon_r, cos_lat):
+    """
+    Calculate distances in meters between consecutive points using Haversine formula.
+
+    Each point's precomputed radians and cosine serve both the step into it
+    and the step out of it; shifted slices are used instead of index arrays,
+    so nothing is gathered or copied.
+    """
+    if haversine_consecutive is not None:
+        out = np.empty(max(lat_r.shape[0] - 1, 0))
+        haversine_consecutive(lat_r, lon_r, cos_lat, out)
+        return out
+
+    a = np.sin(np.diff(lat_r)/2)**2 + cos_lat[:-1] * cos_lat[1:] * np.sin(np.diff(lon_r)/2)**2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+def parse_iso_times(time_strs):
+    """Parse ISO 8601 UTC time strings into epoch seconds"""
+    # datetime64 has no timezone support, so drop the 'Z' and treat times as UTC
+    return np.char.rstrip(np.array(time_strs), 'Z').astype('datetime64[s]').astype(np.int64)
 
 # Parse GPX file
 import os
 script_dir = os.path.dirname(os.path.abspath(__file__))
-tree = ET.parse(os.path.join(script_dir, 'gpx/school.gpx'))
-root = tree.getroot()
-
-# Extract namespace
-ns = {'gpx': 'http://www.topografix.com/GPX/1/1'}
 
-points = []
-for trkpt in root.findall('.//gpx:trkpt', ns):
-    lat = float(trkpt.get('lat'))
-    lon = float(trkpt.get('lon'))
-    ele = float(trkpt.find('gpx:ele', ns).text)
-    time = parse_iso_time(trkpt.find('gpx:time', ns).text)
-    points.append((lat, lon, ele, time))
-
-print(f"Total points: {len(points)}")
+# GPX namespace, in lxml's {uri}tag form
+ns = '{http://www.topografix.com/GPX/1/1}'
+
+# Stream track points instead of building the whole tree, collecting each field in its own column
+lats_list = []
+lons_list = []
+eles_list = []
+time_strs = []
+for _, trkpt in etree.iterparse(os.path.join(script_dir, 'gpx/school.gpx'), events=('end',), tag=ns + 'trkpt'):
+    lats_list.append(float(trkpt.get('lat')))
+    lons_list.append(float(trkpt.get('lon')))
+    eles_list.append(float(trkpt.findtext(ns + 'ele')))
+    time_strs.append(trkpt.findtext(ns + 'time'))
+
+    # Free the point and any already-processed siblings
+    trkpt.clear()
+    while trkpt.getprevious() is not None:
+        del trkpt.getparent()[0]
+
+# Column arrays for vectorized calculations
+lats = np.asarray(lats_list, dtype=np.float64)
+lons = np.asarray(lons_list, dtype=np.float64)
+eles = np.asarray(eles_list, dtype=np.float64)
+times_epoch = parse_iso_times(time_strs)
+times = times_epoch - times_epoch[0]  # seconds since start
+
+# Radians and cos(latitude), computed once and shared by every distance calculation
+lat_r = np.radians(lats)
+lon_r = np.radians(lons)
+cos_lat = np.cos(lat_r)
+point_idx = np.arange(len(lats))
+
+print(f"Total points: {len(lats)}")
 print(f"\nCalculating velocities...\n")
 
-velocities = []
-for i in range(1, len(points)):
-    prev_lat, prev_lon, prev_ele, prev_time = points[i-1]
-    curr_lat, curr_lon, curr_ele, curr_time = points[i]
-
-    # Calculate distance and time
-    dist_meters = haversine_distance(prev_lat, prev_lon, curr_lat, curr_lon)
-    time_seconds = (curr_time - prev_time).total_seconds()
+# Calculate distance and time for every step
+step_dists = haversine_steps(lat_r, lon_r, cos_lat)
+time_deltas = np.diff(times)
 
-    if time_seconds > 0:
-        velocity_mps = dist_meters / time_seconds
-        velocity_mph = velocity_mps * 2.23694
-        velocities.append((i, velocity_mph, time_seconds, dist_meters))
+# Keep only steps where time moved forward
+moving = time_deltas > 0
+step_index = point_idx[1:][moving]
+time_deltas = time_deltas[moving]
+step_dists = step_dists[moving]
+velocity_mps = step_dists / time_deltas
+velocity_mph = velocity_mps * 2.23694
 
 # Find velocity spikes and rapid changes
 print("Point#  Velocity(mph)  TimeDelta(s)  Distance(m)  Notes")
 print("="*70)
 
-prev_vel = 0
-for i, vel, time_delta, dist in velocities:
-    vel_change = abs(vel - prev_vel)
+prev_vels = np.concatenate(([0.0], velocity_mph[:-1]))
+vel_changes = np.abs(velocity_mph - prev_vels)
+# Collect the report rows and write them at once rather than print()ing each one
+rows = []
+for i, vel, time_delta, dist, vel_change in zip(step_index.tolist(), velocity_mph.tolist(),
+                                                time_deltas.tolist(), step_dists.tolist(),
+                                                vel_changes.tolist()):
     notes = []
 
     if vel > 20:
@@ -77,34 +111,30 @@ for i, vel, time_delta, dist in velocities:
         notes.append("STOPPED")
 
     if notes or (i % 20 == 0):  # Print interesting points or every 20th point
-        print(f"{i:6d}  {vel:8.2f}       {time_delta:6.1f}     {dist:8.2f}    {' '.join(notes)}")
-
-    prev_vel = vel
+        rows.append(f"{i:6d}  {vel:8.2f}       {time_delta:6.1f}     {dist:8.2f}    {' '.join(notes)}\n")
+sys.stdout.write(''.join(rows))
 
 # Statistics
-avg_vel = sum(v for _, v, _, _ in velocities) / len(velocities)
-max_vel = max(v for _, v, _, _ in velocities)
-stopped_count = sum(1 for _, v, _, _ in velocities if v < 0.5)
+avg_vel = velocity_mph.mean()
+max_vel = velocity_mph.max()
+stopped_count = np.count_nonzero(velocity_mph < 0.5)
+num_velocities = len(velocity_mph)
 
 print("\n" + "="*70)
 print(f"\nStatistics:")
 print(f"  Average velocity: {avg_vel:.2f} mph")
 print(f"  Maximum velocity: {max_vel:.2f} mph")
-print(f"  Stopped points: {stopped_count} / {len(velocities)} ({100*stopped_count/len(velocities):.1f}%)")
-print(f"  Moving points: {len(velocities) - stopped_count}")
+print(f"  Stopped points: {stopped_count} / {num_velocities} ({100*stopped_count/num_velocities:.1f}%)")
+print(f"  Moving points: {num_velocities - stopped_count}")
 
 # Analyze velocity changes
-changes = []
-for i in range(1, len(velocities)):
-    prev_vel = velocities[i-1][1]
-    curr_vel = velocities[i][1]
-    change = abs(curr_vel - prev_vel)
-    if prev_vel > 1.0 or curr_vel > 1.0:  # Only count when actually moving
-        changes.append(change)
-
-if changes:
-    avg_change = sum(changes) / len(changes)
-    max_change = max(changes)
+all_changes = np.abs(np.diff(velocity_mph))
+actually_moving = (velocity_mph[:-1] > 1.0) | (velocity_mph[1:] > 1.0)  # Only count when actually moving
+changes = all_changes[actually_moving]
+
+if changes.size:
+    avg_change = changes.mean()
+    max_change = changes.max()
     print(f"\nVelocity changes (when moving):")
     print(f"  Average change: {avg_change:.2f} mph/reading")
     print(f"  Maximum change: {max_change:.2f} mph/reading")
@@ -0,0 +1,77 @@
+# cython: language_level=3
+"""
+Compiled haversine helpers for the GPX analysis scripts.
+
+haversine_from_origin (distance from the start point, analyze_loops.py)
+and haversine_consecutive (step distances, both analysis scripts) work on
+coordinates already in radians with cos(latitude) precomputed. The
+scripts use them when the extension has been built and fall back to plain
+NumPy otherwise. To build:
+
+    pip install .
+"""
+
+cimport cython
+from libc.math cimport sin, asin, sqrt
+
+cdef double EARTH_RADIUS = 6371000.0  # Earth radius in meters
+
+
+@cython.cdivision(True)
+cdef inline double haversine_rad(double phi1, double lambda1, double cos_phi1,
+                                 double phi2, double lambda2, double cos_phi2) noexcept nogil:
+    """Haversine distance from coordinates already in radians, with cos(phi) precomputed"""
+    cdef double a = sin((phi2 - phi1) / 2) ** 2 + cos_phi1 * cos_phi2 * sin((lambda2 - lambda1) / 2) ** 2
+    return 2 * EARTH_RADIUS * asin(sqrt(a))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef void haversine_from_origin(double phi1, double lambda1, double cos_phi1,
+                                 const double[::1] lat_r, const double[::1] lon_r, const double[::1] cos_lat,
+                                 double[::1] out):
+    """
+    Haversine distance in meters from one origin to every point, written into
+    out. The origin is passed in radians with cos(phi1) precomputed, so it is
+    converted once instead of once per point.
+    """
+    cdef Py_ssize_t i, n = out.shape[0]
+    if not (lat_r.shape[0] == lon_r.shape[0] == cos_lat.shape[0] == n):
+        raise ValueError("haversine_from_origin: all arrays must have the same length")
+
+    with nogil:
+        for i in range(n):
+            out[i] = haversine_rad(phi1, lambda1, cos_phi1, lat_r[i], lon_r[i], cos_lat[i])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef void haversine_consecutive(const double[::1] lat_r, const double[::1] lon_r, const double[::1] cos_lat,
+                                 double[::1] out):
+    """
+    Haversine distance in meters from each point to the next, written into
+    out (one shorter than the coordinate arrays). Each point's radians and
+    cosine are loaded once and carried over as the start of the next step.
+    """
+    cdef Py_ssize_t i, n = out.shape[0]
+    cdef Py_ssize_t num_points = lat_r.shape[0]
+    cdef double phi1, lambda1, cos_phi1, phi2, lambda2, cos_phi2
+    if not (lon_r.shape[0] == cos_lat.shape[0] == num_points):
+        raise ValueError("haversine_consecutive: coordinate arrays must have the same length")
+    if n != max(num_points - 1, 0):
+        raise ValueError("haversine_consecutive: out must be one shorter than the coordinate arrays")
+
+    with nogil:
+        if n == 0:
+            return
+        phi1 = lat_r[0]
+        lambda1 = lon_r[0]
+        cos_phi1 = cos_lat[0]
+        for i in range(n):
+            phi2 = lat_r[i + 1]
+            lambda2 = lon_r[i + 1]
+            cos_phi2 = cos_lat[i + 1]
+            out[i] = haversine_rad(phi1, lambda1, cos_phi1, phi2, lambda2, cos_phi2)
+            phi1 = phi2
+            lambda1 = lambda2
+            cos_phi1 = cos_phi2
@@ -6,9 +6,197 @@ This script simulates the elevation filtering and smoothing algorithm
 and compares the results against raw GPS data.
 """
 
-import xml.etree.ElementTree as ET
+import functools
+import sys
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Deque, List, Dict, Optional
+
+import numpy as np
+from lxml import etree
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Number of raw elevations kept for pattern-based spike detection
+RAW_WINDOW = 4
+
+# Tracks shorter than this are smoothed with add_reading: importing Numba and
+# loading the compiled kernel (~0.6 s) only pays off at around 100k readings
+JIT_MIN_POINTS = 100_000
+
+
+def _smooth_kernel(elevations: np.ndarray, vertical_accuracies: np.ndarray,
+                   vertical_accuracy_threshold: float, alpha_min: float, alpha_max: float,
+                   trend_window: int, spike_reversal_threshold: float,
+                   low_accuracy_threshold: float):
+    """
+    Run ElevationSmoother.add_reading over a whole track in one compiled loop.
+
+    Compiled lazily by _compiled_smooth_kernel() and only used for tracks of
+    at least JIT_MIN_POINTS readings. The recent raw/accepted elevation lists
+    become fixed-size scratch arrays, and the pattern and adaptive alpha
+    helpers are inlined as plain arithmetic. A negative vertical accuracy
+    means "not available", as in add_reading.
+
+    Statistics are gathered in the same pass, so each elevation is read only
+    once (shorter tracks use NumPy reductions instead, see
+    smooth_batch_with_stats). Means and variances use Welford's online
+    update. Returns (smoothed, raw_mean, raw_var, raw_min, raw_max,
+    smoothed_mean, smoothed_var, smoothed_min, smoothed_max,
+    low_accuracy_count). The variances are population variances.
+    low_accuracy_count counts the vertical accuracies above
+    low_accuracy_threshold.
+
+    Needs at least one elevation. The extremes are seeded from the first
+    one (which is also the first smoothed value) rather than from +/-inf,
+    since the compiled kernel assumes there are no infinities (fastmath).
+    """
+    n = elevations.shape[0]
+    smoothed = np.empty(n, dtype=np.float64)
+
+    raw_mean = 0.0
+    raw_m2 = 0.0
+    raw_min = elevations[0]
+    raw_max = elevations[0]
+    smoothed_mean = 0.0
+    smoothed_m2 = 0.0
+    smoothed_min = elevations[0]
+    smoothed_max = elevations[0]
+    low_accuracy_count = 0
+
+    recent = np.zeros(RAW_WINDOW, dtype=np.float64)
+    recent_count = 0
+    accepted = np.empty(trend_window, dtype=np.float64)
+    accepted_count = 0
+    previous_smoothed = 0.0
+    has_previous = False
+
+    for i in range(n):
+        elevation = elevations[i]
+
+        # Track raw elevations for pattern-based spike detection
+        if recent_count < RAW_WINDOW:
+            recent[recent_count] = elevation
+            recent_count += 1
+        else:
+            for j in range(RAW_WINDOW - 1):
+                recent[j] = recent[j + 1]
+            recent[RAW_WINDOW - 1] = elevation
+
+        # Stage 1: Pattern-based spike detection. The patterns are
+        # evaluated as 0/1 flags and combined arithmetically in priority
+        # order, so the per-point path has no data-dependent branches. While
+        # fewer than 4 readings are buffered these read zero-filled slots and
+        # the result is discarded below.
+        first_change = recent[recent_count - 3] - recent[recent_count - 4]
+        second_last_change = recent[recent_count - 2] - recent[recent_count - 3]
+        last_change = recent[recent_count - 1] - recent[recent_count - 2]
+        first_sign = np.sign(first_change)
+        second_last_sign = np.sign(second_last_change)
+        last_sign = np.sign(last_change)
+
+        # Pattern 1: large change that reverses direction
+        reversal = 1.0 * ((abs(last_change) > spike_reversal_threshold) &
+                          (abs(second_last_change) > spike_reversal_threshold) &
+                          (last_sign * second_last_sign < 0))
+
+        # Pattern 2: alternating directions (+, -, + or -, +, -)
+        oscillating = 1.0 * ((first_sign * second_last_sign < 0) &
+                             (second_last_sign * last_sign < 0))
+
+        # Pattern 3 of add_reading (micro-jitter) needs 5 readings, but only
+        # RAW_WINDOW = 4 are kept, so it can never fire and is left out
+        pattern_accuracy = (8.0 +
+                            reversal * (30.0 - 8.0) +
+                            (1.0 - reversal) * oscillating * (25.0 - 8.0))
+
+        # Conservative for the first few points, before a pattern can form
+        estimated_accuracy = 20.0 if recent_count < 4 else pattern_accuracy
+
+        accuracy_to_use = vertical_accuracies[i] if vertical_accuracies[i] >= 0 else estimated_accuracy
+
+        elevation_to_smooth = elevation
+        was_rejected = False
+        if accuracy_to_use > vertical_accuracy_threshold and has_previous:
+            elevation_to_smooth = previous_smoothed
+            was_rejected = True
+
+        # Track accepted elevations for adaptive smoothing
+        if not was_rejected and trend_window > 0:
+            if accepted_count < trend_window:
+                accepted[accepted_count] = elevation_to_smooth
+                accepted_count += 1
+            else:
+                for j in range(trend_window - 1):
+                    accepted[j] = accepted[j + 1]
+                accepted[trend_window - 1] = elevation_to_smooth
+
+        # Stage 2: Adaptive EMA smoothing
+        alpha = alpha_min
+        if accepted_count >= 3:
+            positive_count = 0
+            negative_count = 0
+            total_magnitude = 0.0
+            for j in range(1, accepted_count):
+                change = accepted[j] - accepted[j - 1]
+                if change > 0:
+                    positive_count += 1
+                elif change < 0:
+                    negative_count += 1
+                total_magnitude += abs(change)
+
+            total_non_zero = positive_count + negative_count
+            if total_non_zero > 0:
+                trend_strength = max(positive_count, negative_count) / total_non_zero
+                magnitude_boost = min(total_magnitude / (accepted_count - 1) / 2.0, 1.0)
+                combined_strength = (trend_strength + magnitude_boost) / 2.0
+                alpha = alpha_min + combined_strength * (alpha_max - alpha_min)
+                alpha = max(alpha_min, min(alpha_max, alpha))
+
+        if has_previous:
+            previous_smoothed = alpha * elevation_to_smooth + (1 - alpha) * previous_smoothed
+        else:
+            previous_smoothed = elevation_to_smooth
+            has_previous = True
+        smoothed[i] = previous_smoothed
+
+        # Running statistics for the raw and smoothed elevations
+        count = i + 1
+        delta = elevation - raw_mean
+        raw_mean += delta / count
+        raw_m2 += delta * (elevation - raw_mean)
+        raw_min = min(raw_min, elevation)
+        raw_max = max(raw_max, elevation)
+
+        delta = previous_smoothed - smoothed_mean
+        smoothed_mean += delta / count
+        smoothed_m2 += delta * (previous_smoothed - smoothed_mean)
+        smoothed_min = min(smoothed_min, previous_smoothed)
+        smoothed_max = max(smoothed_max, previous_smoothed)
+
+        if vertical_accuracies[i] > low_accuracy_threshold:
+            low_accuracy_count += 1
+
+    raw_var = raw_m2 / n
+    smoothed_var = smoothed_m2 / n
+    return (smoothed, raw_mean, raw_var, raw_min, raw_max,
+            smoothed_mean, smoothed_var, smoothed_min, smoothed_max, low_accuracy_count)
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_smooth_kernel():
+    """Compile _smooth_kernel with Numba on first use (numba is imported lazily)."""
+    import numba
+    return numba.njit(cache=True, fastmath=True)(_smooth_kernel)
+
+
+def _batch_arrays(elevations, vertical_accuracies):
+    """Convert batch inputs to float64 arrays; missing vertical accuracies become -1."""
+    elevations = np.ascontiguousarray(elevations, dtype=np.float64)
+    if vertical_accuracies is None:
+        vertical_accuracies = np.full(elevations.shape[0], -1.0)
+    else:
+        vertical_accuracies = np.ascontiguousarray(vertical_accuracies, dtype=np.float64)
+    return elevations, vertical_accuracies
 
 
 class ElevationSmoother:
@@ -23,8 +211,9 @@ class ElevationSmoother:
         self.trend_window = trend_window
         self.spike_reversal_threshold = spike_reversal_threshold
         self.previous_smoothed: Optional[float] = None
-        self.recent_elevations: List[float] = []  # Raw elevations for pattern detection
-        self.recent_accepted_elevations: List[float] = []  # Accepted elevations for trend detection
+        # Ring buffers: appending to a full deque evicts the oldest value
+        self.recent_elevations: Deque[float] = deque(maxlen=RAW_WINDOW)  # Raw elevations for pattern detection
+        self.recent_accepted_elevations: Deque[float] = deque(maxlen=trend_window)  # Accepted elevations for trend detection
 
     def add_reading(self, elevation: float, vertical_accuracy: float = -1.0) -> float:
         """
@@ -34,8 +223,6 @@ class ElevationSmoother:
         """
         # Track raw elevations for pattern-based spike detection
         self.recent_elevations.append(elevation)
-        if len(self.recent_elevations) > 4:
-            self.recent_elevations.pop(0)
 
         # Stage 1: Pattern-based spike detection
         estimated_accuracy = self._estimate_accuracy_from_pattern()
@@ -54,8 +241,6 @@ class ElevationSmoother:
         # Track accepted elevations for adaptive smoothing
         if not was_rejected:
             self.recent_accepted_elevations.append(elevation_to_smooth)
-            if len(self.recent_accepted_elevations) > self.trend_window:
-                self.recent_accepted_elevations.pop(0)
 
         # Stage 2: Adaptive EMA smoothing
         alpha = self._calculate_adaptive_alpha()
@@ -99,7 +284,8 @@ class ElevationSmoother:
                 if signs[0] != signs[1] and signs[1] != signs[2]:
                     return 25.0  # Oscillating noise
 
-        # Pattern 3: Check for micro-jitter (small oscillations around same value)
+        # Pattern 3: Check for micro-jitter (small oscillations around same value).
+        # Note that only RAW_WINDOW = 4 readings are kept, so this never fires.
         if len(self.recent_elevations) >= 5:
             mean = sum(self.recent_elevations) / len(self.recent_elevations)
             max_deviation = max(abs(e - mean) for e in self.recent_elevations)
@@ -140,26 +326,83 @@ class ElevationSmoother:
         alpha = self.alpha_min + combined_strength * (self.alpha_max - self.alpha_min)
         return max(self.alpha_min, min(self.alpha_max, alpha))
 
+    def smooth_batch(self, elevations, vertical_accuracies=None) -> np.ndarray:
+        """
+        Smooth a whole track at once, with the compiled kernel for tracks of
+        at least JIT_MIN_POINTS readings.
+
+        Equivalent to feeding every reading through add_reading on a freshly
+        reset smoother; the streaming state of this instance is left untouched.
+        """
+        elevations, vertical_accuracies = _batch_arrays(elevations, vertical_accuracies)
+        if elevations.shape[0] < JIT_MIN_POINTS:
+            return self._smooth_readings(elevations, vertical_accuracies)
+
+        return _compiled_smooth_kernel()(elevations, vertical_accuracies,
+                                         self.vertical_accuracy_threshold,
+                                         self.alpha_min, self.alpha_max,
+                                         self.trend_window, self.spike_reversal_threshold,
+                                         np.inf)[0]
+
+    def _smooth_readings(self, elevations: np.ndarray, vertical_accuracies: np.ndarray) -> np.ndarray:
+        """Feed the readings through add_reading on a fresh smoother with the same settings."""
+        smoother = ElevationSmoother(self.vertical_accuracy_threshold, self.alpha_min, self.alpha_max,
+                                     self.trend_window, self.spike_reversal_threshold)
+        add_reading = smoother.add_reading
+        return np.array([add_reading(elevation, vertical_accuracy) for elevation, vertical_accuracy
+                         in zip(elevations.tolist(), vertical_accuracies.tolist())], dtype=np.float64)
+
+    def smooth_batch_with_stats(self, elevations, vertical_accuracies=None,
+                                low_accuracy_threshold: float = 15.0):
+        """
+        Like smooth_batch, but also returns statistics of the raw and smoothed
+        elevations.
+
+        Returns (smoothed, raw_stats, smoothed_stats, low_accuracy_count). The
+        stats are dicts with mean, std_dev, min, max and range (empty for an
+        empty track), and low_accuracy_count is the number of readings whose
+        vertical accuracy is above low_accuracy_threshold. On the compiled
+        path the statistics are gathered in the smoothing pass itself.
+        """
+        elevations, vertical_accuracies = _batch_arrays(elevations, vertical_accuracies)
+        if elevations.shape[0] < JIT_MIN_POINTS:
+            smoothed = self._smooth_readings(elevations, vertical_accuracies)
+            return (smoothed,
+                    calculate_statistics(elevations),
+                    calculate_statistics(smoothed),
+                    int(np.count_nonzero(vertical_accuracies > low_accuracy_threshold)))
+
+        (smoothed, raw_mean, raw_var, raw_min, raw_max,
+         smoothed_mean, smoothed_var, smoothed_min, smoothed_max,
+         low_accuracy_count) = _compiled_smooth_kernel()(elevations, vertical_accuracies,
+                                                         self.vertical_accuracy_threshold,
+                                                         self.alpha_min, self.alpha_max,
+                                                         self.trend_window, self.spike_reversal_threshold,
+                                                         low_accuracy_threshold)
+
+        return (smoothed,
+                statistics_from_moments(raw_mean, raw_var, raw_min, raw_max),
+                statistics_from_moments(smoothed_mean, smoothed_var, smoothed_min, smoothed_max),
+                low_accuracy_count)
+
     def reset(self):
         self.previous_smoothed = None
-        self.recent_elevations = []
-        self.recent_accepted_elevations = []
+        self.recent_elevations.clear()
+        self.recent_accepted_elevations.clear()
 
 
 def parse_gpx(file_path: str) -> List[Dict]:
     """Parse GPX file and extract track points."""
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-
-    # Define namespace
-    ns = {'gpx': 'http://www.topografix.com/GPX/1/1'}
+    # Define namespace, in lxml's {uri}tag form
+    ns = '{http://www.topografix.com/GPX/1/1}'
 
+    # Stream track points instead of building the whole tree
     points = []
-    for trkpt in root.findall('.//gpx:trkpt', ns):
+    for _, trkpt in etree.iterparse(file_path, events=('end',), tag=ns + 'trkpt'):
         lat = float(trkpt.get('lat'))
         lon = float(trkpt.get('lon'))
-        ele = float(trkpt.find('gpx:ele', ns).text)
-        time_str = trkpt.find('gpx:time', ns).text
+        ele = float(trkpt.findtext(ns + 'ele'))
+        time_str = trkpt.findtext(ns + 'time')
 
         points.append({
             'lat': lat,
@@ -168,29 +411,69 @@ def parse_gpx(file_path: str) -> List[Dict]:
             'time': time_str
         })
 
+        # Free the point and any already-processed siblings
+        trkpt.clear()
+        while trkpt.getprevious() is not None:
+            del trkpt.getparent()[0]
+
     return points
 
 
-def calculate_statistics(elevations: List[float]) -> Dict[str, float]:
-    """Calculate statistics for a list of elevations."""
-    if not elevations:
+def calculate_statistics(elevations: np.ndarray) -> Dict[str, float]:
+    """Calculate statistics for an array of elevations."""
+    if elevations.size == 0:
         return {}
 
-    mean = sum(elevations) / len(elevations)
-    variance = sum((e - mean) ** 2 for e in elevations) / len(elevations)
-    std_dev = variance ** 0.5
-    min_ele = min(elevations)
-    max_ele = max(elevations)
+    min_ele = elevations.min()
+    max_ele = elevations.max()
 
+    return {
+        'mean': elevations.mean(),
+        'std_dev': elevations.std(),
+        'min': min_ele,
+        'max': max_ele,
+        'range': max_ele - min_ele
+    }
+
+
+def statistics_from_moments(mean: float, variance: float, min_ele: float, max_ele: float) -> Dict[str, float]:
+    """Build the elevation statistics dict from precomputed moments and extremes."""
     return {
         'mean': mean,
-        'std_dev': std_dev,
+        'std_dev': variance ** 0.5,
         'min': min_ele,
         'max': max_ele,
         'range': max_ele - min_ele
     }
 
 
+def compute_vertical_accuracies(elevations: np.ndarray, half_window: int = 5) -> np.ndarray:
+    """
+    Simulate vertical accuracy for every point from the elevation variance of
+    the surrounding window (the points within half_window on either side).
+
+    In real data this would come from the GPS; here we assume poor accuracy
+    when elevation changes rapidly.
+    """
+    elevations = np.asarray(elevations, dtype=np.float64)
+    if elevations.size == 0:
+        return np.empty(0)
+
+    # Edge padding keeps one full window per point; the ends are overwritten below
+    padded = np.pad(elevations, half_window, mode='edge')
+    std_devs = sliding_window_view(padded, 2 * half_window + 1).std(axis=1)
+
+    # High variance suggests poor GPS quality
+    accuracies = np.where(std_devs > 3, 25.0,  # Poor accuracy
+                          np.where(std_devs > 2, 18.0,  # Moderate accuracy
+                                   10.0))  # Good accuracy
+
+    # Start and end might have poor accuracy
+    accuracies[:half_window] = 20.0
+    accuracies[len(accuracies) - half_window:] = 20.0
+    return accuracies
+
+
 def main():
     import os
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -208,30 +491,11 @@ def main():
     print()
 
     # Extract raw elevations
-    raw_elevations = [p['ele'] for p in points]
-
-    # Simulate vertical accuracy (in real data, this would come from GPS)
-    # For this test, we'll assume poor accuracy when elevation changes rapidly
-    def estimate_vertical_accuracy(idx: int, points: List[Dict]) -> float:
-        """Estimate vertical accuracy based on elevation variance."""
-        if idx < 5 or idx >= len(points) - 5:
-            # Start and end might have poor accuracy
-            return 20.0
-
-        # Look at elevation change in surrounding points
-        window = points[max(0, idx-5):min(len(points), idx+6)]
-        elevations = [p['ele'] for p in window]
-        mean = sum(elevations) / len(elevations)
-        variance = sum((e - mean) ** 2 for e in elevations) / len(elevations)
-        std_dev = variance ** 0.5
-
-        # High variance suggests poor GPS quality
-        if std_dev > 3:
-            return 25.0  # Poor accuracy
-        elif std_dev > 2:
-            return 18.0  # Moderate accuracy
-        else:
-            return 10.0  # Good accuracy
+    raw_elevations = np.asarray([p['ele'] for p in points], dtype=np.float64)
+
+    # Simulate vertical accuracy once for the whole track (in real data, this
+    # would come from GPS) and reuse it for the report below
+    v_accs = compute_vertical_accuracies(raw_elevations)
 
     # Apply smoothing with pattern-based spike detection and adaptive alpha
     smoother = ElevationSmoother(
@@ -241,20 +505,11 @@ def main():
         trend_window=5,
         spike_reversal_threshold=3.0
     )
-    smoothed_elevations = []
-    rejected_count = 0
-
-    for idx, point in enumerate(points):
-        v_acc = estimate_vertical_accuracy(idx, points)
-        smoothed = smoother.add_reading(point['ele'], v_acc)
-        smoothed_elevations.append(smoothed)
-
-        if v_acc > 15.0:
-            rejected_count += 1
 
-    # Calculate statistics
-    raw_stats = calculate_statistics(raw_elevations)
-    smoothed_stats = calculate_statistics(smoothed_elevations)
+    # Smooth and calculate statistics in a single pass over the track
+    smoothed_elevations, raw_stats, smoothed_stats, rejected_count = smoother.smooth_batch_with_stats(
+        raw_elevations, v_accs, low_accuracy_threshold=15.0)
+    raw_changes = np.diff(raw_elevations)
 
     print("RAW ELEVATION STATISTICS:")
     print(f"  Mean:     {raw_stats['mean']:.2f}m")
@@ -286,17 +541,17 @@ def main():
     print(f"{'Index':<8} {'Time':<10} {'Raw':<8} {'Smoothed':<10} {'Change':<8} {'V.Acc':<8}")
     print("-" * 70)
 
-    for i in range(min(100, len(points))):
-        if i > 0:
-            raw_change = points[i]['ele'] - points[i-1]['ele']
-            smoothed_change = smoothed_elevations[i] - smoothed_elevations[i-1]
-            v_acc = estimate_vertical_accuracy(i, points)
-
-            # Show significant changes or rejections
-            if abs(raw_change) > 2.0 or v_acc > 15.0:
-                time = points[i]['time'].split('T')[1][:8]
-                print(f"{i:<8} {time:<10} {points[i]['ele']:<8.1f} "
-                      f"{smoothed_elevations[i]:<10.1f} {raw_change:<8.1f} {v_acc:<8.1f}")
+    rows = []
+    for i in range(1, min(100, len(points))):
+        raw_change = raw_changes[i-1]
+        v_acc = v_accs[i]
+
+        # Show significant changes or rejections
+        if abs(raw_change) > 2.0 or v_acc > 15.0:
+            time = points[i]['time'].split('T')[1][:8]
+            rows.append(f"{i:<8} {time:<10} {raw_elevations[i]:<8.1f} "
+                        f"{smoothed_elevations[i]:<10.1f} {raw_change:<8.1f} {v_acc:<8.1f}\n")
+    sys.stdout.write(''.join(rows))
 
     print()
     print("=" * 70)